@@ -4,10 +4,24 @@ import time
 import json
 import re
 import csv
+import random
 import logging
 import logging.handlers
+import queue
+import heapq
+import bisect
+import itertools
+import signal
+import atexit
+import threading
 import requests
-import base64
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import binascii
+import hashlib
+import math
+import struct
 from pathlib import Path
 from datetime import datetime, timedelta
 from urllib.parse import urljoin
@@ -21,11 +35,13 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.keys import Keys
-from collections import defaultdict
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Для Google Sheets
 try:
     import gspread
+    from gspread.utils import absolute_range_name
     from google.oauth2.service_account import Credentials
 
     GOOGLE_SHEETS_AVAILABLE = True
@@ -34,9 +50,114 @@ except ImportError:
     print("Предупреждение: Библиотеки для Google Sheets не установлены. Установите: pip install gspread google-auth")
     print("Данные будут сохраняться только в локальные файлы.")
 
+# Для быстрого поиска адресов из Лист2 (необязательно, без него - перебор словаря)
+try:
+    import ahocorasick
+
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Быстрая сериализация JSON для запросов к Telegram (необязательно)
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _json_dumps(obj):
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Регулярные выражения компилируются один раз при загрузке модуля
+_RE_SPREADSHEET_ID_1 = re.compile(r'/spreadsheets/d/([a-zA-Z0-9-_]+)')
+_RE_SPREADSHEET_ID_2 = re.compile(r'd/([a-zA-Z0-9-_]+)')
+_RE_TASK_ID = re.compile(r'openRouteTaskInfo\((\d+)\)')
+_RE_TASK_ID_FALLBACK = re.compile(r'(\d+)')
+# Госномер (А123БВ77 / А123Б77) и ФИО вида "Иванов И. И." / "Иванов И.И."
+_RE_PLATE = re.compile(r'[А-Я]\d{3}[А-Я]{1,2}\d{2,3}')
+_RE_DRIVER_NAME = re.compile(r'[А-Я][а-яё]+ [А-Я]\.\s?[А-Я]\.')
+_RE_WHITESPACE = re.compile(r'\s+')
+# Подпись диспетчера в строке проблематики ("Асланов И. Х.") и её отдельные слова
+_RE_DISPATCHER_LINE = re.compile(r'Асланов|И\. Х\.')
+_RE_DISPATCHER_WORD = re.compile(r'Асланов|И\.|Х\.')
+
+
+def collapse_whitespace(text):
+    """Схлопывает пробельные символы в один пробел и обрезает края"""
+    return _RE_WHITESPACE.sub(' ', text).strip()
+
 
 # ==================== НАСТРОЙКА ЛОГИРОВАНИЯ ====================
+LOG_BUFFER_CAPACITY = 512
+LOG_FLUSH_INTERVAL = 30  # секунд
+
+_log_listeners = []
+_buffered_log_handlers = []
+
+
+def _run_periodically(interval, func, name):
+    """Фоновый поток-демон, вызывающий func каждые interval секунд"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                func()
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=loop, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def _flush_buffered_log_handlers():
+    for handler in list(_buffered_log_handlers):
+        handler.flush()
+
+
+def _stop_log_listeners():
+    while _log_listeners:
+        _log_listeners.pop().stop()
+    while _buffered_log_handlers:
+        _buffered_log_handlers.pop().close()
+
+
+atexit.register(_stop_log_listeners)
+_run_periodically(LOG_FLUSH_INTERVAL, _flush_buffered_log_handlers, 'log-flush')
+
+
+def _buffered(handler):
+    """Копит записи в памяти и пишет в файл пачкой (сразу - при WARNING и выше)"""
+    memory_handler = logging.handlers.MemoryHandler(
+        capacity=LOG_BUFFER_CAPACITY,
+        flushLevel=logging.WARNING,
+        target=handler,
+        flushOnClose=True
+    )
+    memory_handler.setLevel(handler.level)
+    _buffered_log_handlers.append(memory_handler)
+    return memory_handler
+
+
+def _attach_queue_listener(target_logger, *handlers):
+    """Запись в файлы/консоль выполняется фоновым потоком, логгер только кладёт запись в очередь"""
+    log_queue = queue.Queue(-1)
+    target_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _log_listeners.append(listener)
+
+
 def setup_logging(log_level=logging.INFO):
+    _stop_log_listeners()
+
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
 
@@ -70,13 +191,12 @@ def setup_logging(log_level=logging.INFO):
     console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', date_format)
     console_handler.setFormatter(console_formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(error_handler)
-    logger.addHandler(console_handler)
+    _attach_queue_listener(logger, _buffered(file_handler), error_handler, console_handler)
 
     telegram_logger = logging.getLogger('telegram')
     telegram_logger.setLevel(logging.DEBUG)
     telegram_logger.propagate = False
+    telegram_logger.handlers.clear()
     telegram_handler = logging.handlers.RotatingFileHandler(
         filename=log_dir / 'telegram_debug.log',
         maxBytes=5 * 1024 * 1024,
@@ -85,11 +205,12 @@ def setup_logging(log_level=logging.INFO):
     )
     telegram_handler.setLevel(logging.DEBUG)
     telegram_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    telegram_logger.addHandler(telegram_handler)
+    _attach_queue_listener(telegram_logger, _buffered(telegram_handler))
 
     selenium_logger = logging.getLogger('selenium')
     selenium_logger.setLevel(logging.WARNING)
     selenium_logger.propagate = False
+    selenium_logger.handlers.clear()
     selenium_handler = logging.handlers.RotatingFileHandler(
         filename=log_dir / 'selenium.log',
         maxBytes=2 * 1024 * 1024,
@@ -98,7 +219,7 @@ def setup_logging(log_level=logging.INFO):
     )
     selenium_handler.setLevel(logging.WARNING)
     selenium_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    selenium_logger.addHandler(selenium_handler)
+    _attach_queue_listener(selenium_logger, selenium_handler)
 
     logger.info(f"Логирование инициализировано. Уровень: {logging.getLevelName(log_level)}")
     return logger
@@ -114,6 +235,24 @@ class TelegramBot:
         self.base_url = f"https://api.telegram.org/bot{token}"
         self.telegram_logger = logging.getLogger('telegram')
 
+        # Одна сессия на все запросы: keep-alive вместо нового TCP+TLS на каждое сообщение
+        self.session = requests.Session()
+        self.session.headers['Connection'] = 'keep-alive'
+        # POST в Telegram не идемпотентен: после таймаута чтения или 5xx сообщение могло уже уйти,
+        # повтор дал бы дубль. Повторяем только ошибки соединения и 429 (с учётом Retry-After)
+        retries = Retry(
+            total=3,
+            read=0,
+            backoff_factor=0.3,
+            status_forcelist=[429],
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False
+        )
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries))
+
+        # Отправка идёт в фоновых потоках (только HTTP, Selenium сюда не попадает)
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='tg')
+
         if not token:
             logger.warning("Telegram токен не настроен. Отправка в Telegram отключена.")
             self.enabled = False
@@ -121,7 +260,20 @@ class TelegramBot:
             self.enabled = True
             logger.info(f"Telegram бот инициализирован. Токен: {token[:5]}...")
 
+    def send_batch(self, calls):
+        """Запустить все отправки одного события сразу и дождаться их (время - как у самой долгой)
+
+        calls - список пар (метод send_*, кортеж аргументов); возвращает список результатов.
+        """
+        futures = [method(*args) for method, args in calls]
+        return [future.result() for future in futures]
+
+    # send_message_to_chat ставит отправку в очередь и возвращает Future (для send_batch);
+    # send_*_now отправляют сразу в текущем потоке - для кода, который сам уже работает в фоновом потоке
     def send_message_to_chat(self, chat_id, text, parse_mode='HTML'):
+        return self._executor.submit(self.send_message_now, chat_id, text, parse_mode)
+
+    def send_message_now(self, chat_id, text, parse_mode='HTML'):
         if not self.enabled:
             return False
         if not chat_id:
@@ -135,7 +287,8 @@ class TelegramBot:
                 'parse_mode': parse_mode,
                 'disable_web_page_preview': True
             }
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.session.post(url, data=_json_dumps(payload),
+                                         headers={'Content-Type': 'application/json'}, timeout=10)
             if response.status_code == 200:
                 logger.info(f"✅ Сообщение отправлено в чат {chat_id}")
                 self.telegram_logger.info(f"Сообщение отправлено в {chat_id}: {text[:100]}...")
@@ -149,7 +302,7 @@ class TelegramBot:
             self.telegram_logger.error(f"Исключение для чата {chat_id}: {e}")
             return False
 
-    def send_photo_bytes_to_chat(self, chat_id, photo_data, caption="", parse_mode='HTML'):
+    def send_photo_now(self, chat_id, photo_data, caption="", parse_mode='HTML'):
         if not self.enabled:
             return False
         if not chat_id:
@@ -163,7 +316,7 @@ class TelegramBot:
                 'caption': caption[:1024] if caption else "",
                 'parse_mode': parse_mode
             }
-            response = requests.post(url, files=files, data=data, timeout=15)
+            response = self.session.post(url, files=files, data=data, timeout=15)
             if response.status_code == 200:
                 logger.info(f"✅ Фото отправлено в чат {chat_id}")
                 self.telegram_logger.info(f"Фото отправлено в {chat_id}")
@@ -177,7 +330,7 @@ class TelegramBot:
             self.telegram_logger.error(f"Исключение для чата {chat_id}: {e}")
             return False
 
-    def send_media_group_bytes_to_chat(self, chat_id, photos_data, caption=""):
+    def send_media_group_now(self, chat_id, photos_data, caption=""):
         if not self.enabled:
             return False
         if not chat_id:
@@ -201,10 +354,10 @@ class TelegramBot:
                 files[file_name] = (f'photo_{i}.jpg', photo_data, 'image/jpeg')
             if not media:
                 return False
-            files['media'] = (None, json.dumps(media), 'application/json')
+            files['media'] = (None, _json_dumps(media), 'application/json')
             url = f"{self.base_url}/sendMediaGroup"
             params = {'chat_id': chat_id}
-            response = requests.post(url, params=params, files=files, timeout=30)
+            response = self.session.post(url, params=params, files=files, timeout=30)
             if response.status_code == 200:
                 logger.info(f"✅ Медиагруппа из {len(media)} фото отправлена в чат {chat_id}")
                 self.telegram_logger.info(f"Медиагруппа в {chat_id}: {len(media)} фото")
@@ -220,15 +373,31 @@ class TelegramBot:
 
 
 # ==================== GOOGLE SHEETS ====================
+STORAGE_FLUSH_ROWS = 10
+STORAGE_FLUSH_INTERVAL = 30  # секунд
+SHEETS_RETRY_DEADLINE = 30  # секунд на все попытки одной записи
+
+
 class GoogleSheetManager:
-    def __init__(self, credentials_path, spreadsheet_url):
+    def __init__(self, credentials_path, spreadsheet_url, on_saved=None):
         self.credentials_path = credentials_path
         self.spreadsheet_url = spreadsheet_url
+        # on_saved(rows, vlookup_matches) вызывается после того, как строки реально записаны в таблицу
+        self.on_saved = on_saved
         self.client = None
         self.spreadsheet = None
         self.worksheet = None
         self.lookup_worksheet = None
         self.address_district_map = {}
+        self._address_automaton = None
+        # Адреса Лист2 одной строкой через '\n' и смещения их начал - обратный поиск одним str.find
+        self._address_keys = []
+        self._address_blob = ''
+        self._address_offsets = []
+        self._next_row = None
+        self._pending_rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
 
         self.headers = [
             "Timestamp", "ID Задания", "Адрес", "Тип тары",
@@ -237,7 +406,8 @@ class GoogleSheetManager:
         ]
         self.headers.append("Округ (VLOOKUP)")
 
-        self.setup_google_sheets()
+        if self.setup_google_sheets():
+            _run_periodically(STORAGE_FLUSH_INTERVAL, self.flush, 'sheets-flush')
 
     def setup_google_sheets(self):
         if not GOOGLE_SHEETS_AVAILABLE:
@@ -263,6 +433,9 @@ class GoogleSheetManager:
             else:
                 logger.info("Заголовки в Google Таблице уже существуют")
 
+            # Номер следующей строки считаем один раз, дальше ведём счётчик сами
+            self._next_row = len(self.worksheet.col_values(1)) + 1
+
             try:
                 self.lookup_worksheet = self.spreadsheet.worksheet("Лист2")
                 logger.info("✅ Лист2 найден, загружаем данные для VLOOKUP...")
@@ -280,6 +453,10 @@ class GoogleSheetManager:
 
     def load_lookup_data(self):
         self.address_district_map.clear()
+        self._address_automaton = None
+        self._address_keys = []
+        self._address_blob = ''
+        self._address_offsets = []
         if not self.lookup_worksheet:
             return
         try:
@@ -289,32 +466,66 @@ class GoogleSheetManager:
             start_row = 1 if all_rows[0][0].lower() in ['адрес', 'address'] else 0
             for row in all_rows[start_row:]:
                 if len(row) >= 2 and row[0].strip():
-                    address = row[0].strip().lower()
+                    address = self.normalize_address(row[0])
                     district = row[1].strip()
                     self.address_district_map[address] = district
+            if AHOCORASICK_AVAILABLE and self.address_district_map:
+                automaton = ahocorasick.Automaton()
+                for address, district in self.address_district_map.items():
+                    automaton.add_word(address, (len(address), district))
+                automaton.make_automaton()
+                self._address_automaton = automaton
+                self._address_keys = list(self.address_district_map)
+                self._address_blob = '\n'.join(self._address_keys)
+                offset = 0
+                for key in self._address_keys:
+                    self._address_offsets.append(offset)
+                    offset += len(key) + 1
             logger.info(f"Загружено {len(self.address_district_map)} записей из Лист2")
         except Exception as e:
             logger.error(f"Ошибка загрузки данных из Лист2: {e}")
 
+    @staticmethod
+    def normalize_address(address):
+        # casefold + ё->е + схлопывание пробелов: адреса с сайта и из Лист2 пишутся по-разному
+        return collapse_whitespace(address.casefold().replace('ё', 'е'))
+
     def get_district_by_address(self, address):
         if not address:
             return None
-        addr_lower = address.lower().strip()
+        addr_lower = self.normalize_address(address)
         if addr_lower in self.address_district_map:
             return self.address_district_map[addr_lower]
+        if self._address_automaton is not None:
+            # Все адреса из Лист2, входящие в искомый, находятся за один проход по строке;
+            # берём самый длинный из них - он точнее (улица с домом, а не одна улица)
+            best = max(self._address_automaton.iter(addr_lower), key=lambda match: match[1][0], default=None)
+            if best is not None:
+                return best[1][1]
+            # Искомый адрес внутри адреса из Лист2: поиск по общей строке в C, без цикла по ключам.
+            # '\n' в нормализованном адресе нет, поэтому совпадение не может захватить два ключа
+            pos = self._address_blob.find(addr_lower)
+            if pos == -1:
+                return None
+            key = self._address_keys[bisect.bisect_right(self._address_offsets, pos) - 1]
+            return self.address_district_map[key]
         for key, value in self.address_district_map.items():
             if key in addr_lower or addr_lower in key:
                 return value
         return None
 
     def extract_spreadsheet_id(self, url):
-        patterns = [r'/spreadsheets/d/([a-zA-Z0-9-_]+)', r'd/([a-zA-Z0-9-_]+)']
-        for pattern in patterns:
-            match = re.search(pattern, url)
+        for pattern in (_RE_SPREADSHEET_ID_1, _RE_SPREADSHEET_ID_2):
+            match = pattern.search(url)
             if match:
                 return match.group(1)
         return url if len(url) > 20 and '/' not in url else None
 
+    def ensure_rows(self, last_row):
+        # В отличие от append_row, запись по диапазону не расширяет лист автоматически
+        if last_row > self.worksheet.row_count:
+            self.worksheet.add_rows(max(last_row - self.worksheet.row_count, 500))
+
     def add_row(self, data):
         if not self.worksheet:
             return False
@@ -329,7 +540,7 @@ class GoogleSheetManager:
                     f"Адрес '{address}' не найден в Лист2, оставляем извлеченное значение: {data.get('city_district', 'Не определено')}")
 
             row_data = [
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                data.get('timestamp') or datetime.now().strftime(TIMESTAMP_FORMAT),
                 data.get('task_id', 'Неизвестно'),
                 address,
                 data.get('container_type', ''),
@@ -339,33 +550,81 @@ class GoogleSheetManager:
                 data.get('vehicle', ''),
                 data.get('photos_str', 'Нет фото'),
                 data.get('status', 'Успешно'),
-                data.get('telegram_sent', 'Нет'),
-                ''
+                data.get('telegram_sent', 'Нет')
             ]
 
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    added_row = self.worksheet.append_row(row_data, value_input_option='USER_ENTERED')
-                    logger.info(f"✅ Данные добавлены в Google Таблицу: {address[:50]}...")
-
-                    all_values = self.worksheet.get_all_values()
-                    row_number = len(all_values)
+            with self._lock:
+                self._pending_rows.append((row_data, bool(district_from_lookup)))
+                pending_count = len(self._pending_rows)
+            logger.info(f"Строка поставлена в очередь Google Таблицы: {address[:50]}...")
 
-                    formula = f'=VLOOKUP(C{row_number};\'Лист2\'!A:B;2;0)'
-                    self.worksheet.update_cell(row_number, 12, formula)
-                    logger.debug(f"Вставлена формула в L{row_number}: {formula}")
+            if pending_count >= STORAGE_FLUSH_ROWS:
+                self.flush()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка добавления данных в Google Таблицу: {e}")
+            return False
 
+    def flush(self):
+        """Записать накопленные строки и формулы VLOOKUP одним запросом"""
+        # _flush_lock упорядочивает сбросы (и _next_row), _lock защищает только очередь:
+        # сеть и паузы между повторами идут без _lock, add_row в это время не блокируется
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending_rows or not self.worksheet:
+                    return True
+                batch = list(self._pending_rows)
+            rows = [row for row, _ in batch]
+            first_row = self._next_row
+            last_row = first_row + len(rows) - 1
+            sheet_title = self.worksheet.title
+            formulas = [[f'=VLOOKUP(C{n};\'Лист2\'!A:B;2;0)'] for n in range(first_row, last_row + 1)]
+
+            max_retries = 5
+            deadline = time.monotonic() + SHEETS_RETRY_DEADLINE
+            for attempt in range(max_retries):
+                try:
+                    self.ensure_rows(last_row)
+                    self.spreadsheet.values_batch_update({
+                        'valueInputOption': 'USER_ENTERED',
+                        'data': [
+                            {'range': absolute_range_name(sheet_title, f"A{first_row}:K{last_row}"), 'values': rows},
+                            {'range': absolute_range_name(sheet_title, f"L{first_row}:L{last_row}"), 'values': formulas}
+                        ]
+                    })
+                    self._next_row = last_row + 1
+                    with self._lock:
+                        del self._pending_rows[:len(batch)]
+                    logger.info(f"✅ В Google Таблицу записано строк: {len(rows)} (строки {first_row}-{last_row})")
+                    if self.on_saved:
+                        self.on_saved(len(rows), sum(1 for _, matched in batch if matched))
                     return True
                 except Exception as e:
-                    if attempt < max_retries - 1:
-                        time.sleep(2)
-                    else:
-                        logger.error(f"❌ Ошибка добавления данных в Google Таблицу после {max_retries} попыток: {e}")
+                    if self.is_permanent_error(e):
+                        # Пачку не оставляем в очереди: иначе каждый add_row снова упирается в ту же ошибку.
+                        # Строки остаются в CSV и backup_*.jsonl, в лог пишем, какие задания не попали в таблицу
+                        with self._lock:
+                            del self._pending_rows[:len(batch)]
+                        logger.error(f"❌ Ошибка добавления данных в Google Таблицу (повтор не поможет): {e}")
+                        logger.error(f"Не записаны в Google Таблицу задания: {', '.join(str(row[1]) for row in rows)}")
                         return False
-        except Exception as e:
-            logger.error(f"❌ Ошибка добавления данных в Google Таблицу: {e}")
-            return False
+                    # Экспоненциальная задержка со случайным разбросом (full jitter)
+                    delay = random.uniform(0, min(2 ** attempt, 8))
+                    if attempt == max_retries - 1 or time.monotonic() + delay > deadline:
+                        logger.error(f"❌ Ошибка добавления данных в Google Таблицу после {attempt + 1} попыток: {e}")
+                        return False
+                    logger.warning(f"Временная ошибка Google Таблицы, повтор через {delay:.1f} сек: {e}")
+                    time.sleep(delay)
+
+    @staticmethod
+    def is_permanent_error(error):
+        # Повтор бесполезен только при отказе API с кодом 4xx (кроме 429 - превышения квоты).
+        # Всё остальное - сеть, обновление токена google-auth, обрыв ответа, 5xx - временное:
+        # повторяем, а при неудаче пачка остаётся в очереди до следующего сброса
+        if isinstance(error, gspread.exceptions.APIError):
+            status = getattr(getattr(error, 'response', None), 'status_code', None)
+            return status is not None and 400 <= status < 500 and status != 429
+        return False
 
 
 # ==================== CSV MANAGER ====================
@@ -377,7 +636,12 @@ class CSVManager:
             "Проблематика", "Городской округ", "ФИО", "ТС",
             "Фото (ссылки)", "Статус обработки", "Telegram отправлено"
         ]
-        self.setup_csv()
+        self._file = None
+        self._writer = None
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        if self.setup_csv():
+            _run_periodically(STORAGE_FLUSH_INTERVAL, self.flush, 'csv-flush')
 
     def setup_csv(self):
         try:
@@ -387,13 +651,18 @@ class CSVManager:
                     writer = csv.writer(f, delimiter=';')
                     writer.writerow(self.headers)
                 logger.info(f"✅ Создан CSV файл: {self.filename}")
+            # Файл держим открытым, строки копятся в буфере и сбрасываются пачкой
+            self._file = open(self.filename, 'a', newline='', encoding='utf-8', buffering=1 << 16)
+            self._writer = csv.writer(self._file, delimiter=';')
+            return True
         except Exception as e:
             logger.error(f"❌ Ошибка создания CSV файла: {e}")
+            return False
 
     def add_row(self, data):
         try:
             row_data = [
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                data.get('timestamp') or datetime.now().strftime(TIMESTAMP_FORMAT),
                 data.get('task_id', 'Неизвестно'),
                 data.get('address', ''),
                 data.get('container_type', ''),
@@ -405,18 +674,366 @@ class CSVManager:
                 data.get('status', 'Успешно'),
                 data.get('telegram_sent', 'Нет')
             ]
-            with open(self.filename, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f, delimiter=';')
-                writer.writerow(row_data)
+            with self._lock:
+                self._writer.writerow(row_data)
+                self._pending_count += 1
+                pending_count = self._pending_count
+            if pending_count >= STORAGE_FLUSH_ROWS:
+                self.flush()
             logger.info(f"✅ Данные сохранены в CSV: {data.get('address', '')[:50]}...")
             return True
         except Exception as e:
             logger.error(f"❌ Ошибка сохранения в CSV: {e}")
             return False
 
+    def flush(self):
+        with self._lock:
+            if self._file and self._pending_count:
+                self._file.flush()
+                self._pending_count = 0
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+# ==================== CHROMEDRIVER ====================
+_chromedriver_path = None
+
+
+def get_chromedriver_path():
+    """Путь к chromedriver: CHROMEDRIVER_PATH из окружения, иначе webdriver_manager (один раз за процесс)"""
+    global _chromedriver_path
+    if not _chromedriver_path:
+        _chromedriver_path = os.getenv('CHROMEDRIVER_PATH') or ChromeDriverManager().install()
+    return _chromedriver_path
+
+
+# ==================== ОГРАНИЧЕННОЕ МНОЖЕСТВО ====================
+class BoundedSet:
+    """LRU-множество ограниченного размера: при переполнении вытесняются давно не встречавшиеся элементы"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        self._items[item] = None
+        self._items.move_to_end(item)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def touch(self, item):
+        """Отмечает элемент как недавно встреченный; True, если он есть в множестве"""
+        if item in self._items:
+            self._items.move_to_end(item)
+            return True
+        return False
+
+
+# ==================== ЭЛЕМЕНТ ЗАДАНИЯ ====================
+class TaskElement:
+    """Элемент задания в списке: если Angular перерисовал список, элемент заново ищется по id задания"""
+
+    def __init__(self, element, task_id, locate):
+        self._element = element
+        self.task_id = task_id
+        self._locate = locate
+        # Задание пропало со страницы: элемент устарел и по id больше не находится
+        self.gone = False
+
+    def _call(self, action):
+        try:
+            return action(self._element)
+        except StaleElementReferenceException:
+            if not self.task_id:
+                self.gone = True
+                raise
+            try:
+                self._element = self._locate(self.task_id)
+            except NoSuchElementException:
+                self.gone = True
+                raise
+            return action(self._element)
+
+    def click(self):
+        return self._call(lambda element: element.click())
+
+    def is_displayed(self):
+        return self._call(lambda element: element.is_displayed())
+
+
+# ==================== ДЕДУПЛИКАЦИЯ МЕЖДУ ПЕРЕЗАПУСКАМИ ====================
+class BloomFilter:
+    """Фильтр Блума с сохранением в файл: запоминает обработанные задания между перезапусками.
+
+    Ложноположительный ответ возможен с вероятностью error_rate, ложноотрицательный - нет.
+    Когда записано больше capacity ключей, фильтр очищается, чтобы вероятность ошибки не росла.
+    """
+
+    HEADER = struct.Struct('<4sIII')
+    MAGIC = b'BLM1'
+
+    def __init__(self, path, capacity, error_rate):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _positions(self, key):
+        # blake2b, а не hash(): хэш строк в Python меняется от запуска к запуску
+        digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            if self.count >= self.capacity:
+                logger.info("Фильтр обработанных заданий заполнен, начинаем заново")
+                self._bits = bytearray(len(self._bits))
+                self.count = 0
+            for pos in positions:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+            self._dirty = True
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                magic, num_bits, num_hashes, count = self.HEADER.unpack(f.read(self.HEADER.size))
+                bits = f.read()
+            if magic != self.MAGIC or num_bits != self.num_bits or num_hashes != self.num_hashes \
+                    or len(bits) != len(self._bits):
+                logger.warning(f"Файл {self.path} создан с другими параметрами, история заданий сброшена")
+                return
+            self._bits = bytearray(bits)
+            self.count = count
+            logger.info(f"Загружена история обработанных заданий: {count} записей")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = self.HEADER.pack(self.MAGIC, self.num_bits, self.num_hashes, self.count) + bytes(self._bits)
+            self._dirty = False
+        # Запись во временный файл и атомарная замена: при сбое старая история не теряется
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Не удалось сохранить {self.path}: {e}")
+
 
 # ==================== ELEMENT MONITOR ====================
+MAX_PROCESSED_TASKS = 50000
+# История обработанных заданий на диске: после перезапуска задания не отправляются повторно
+DEDUP_BLOOM_PATH = 'dedup.bloom'
+DEDUP_BLOOM_CAPACITY = 100000
+DEDUP_BLOOM_ERROR_RATE = 1e-5
+# Страница перезагружается (раз в 5 проверок), только если успешно обработанных заданий не было дольше этого времени
+PAGE_REFRESH_IDLE_SECONDS = 300
+TASK_PACING_SECONDS = 1.5
+# Сколько отправок в Telegram (задание x чат) может ждать в очереди одновременно
+TELEGRAM_MAX_PENDING = 12
+# Пауза перед повтором неудачного задания: удваивается с каждой попыткой
+RETRY_BACKOFF_SECONDS = 30
+RETRY_BACKOFF_MAX_SECONDS = 600
+ROUTES_TAB_SELECTOR = 'label[uib-btn-radio="\'ROUTES\'"]'
+
+# FNV-1a по тексту и ng-click заданий. Элементы, которые уже разобраны, помечаются __monitorSeen:
+# если Angular перерисовал список (или страница перезагружена), метки нет и хэш не считается
+TASK_LIST_HASH_JS = """
+function taskListHash(elements) {
+    var hash = 0x811c9dc5;
+    for (var i = 0; i < elements.length; i++) {
+        if (!elements[i].__monitorSeen) {
+            return null;
+        }
+        var text = (elements[i].innerText || '') + '|' + (elements[i].getAttribute('ng-click') || '') + '#';
+        for (var j = 0; j < text.length; j++) {
+            hash ^= text.charCodeAt(j);
+            hash = Math.imul(hash, 0x01000193) >>> 0;
+        }
+    }
+    return elements.length + ':' + hash;
+}
+"""
+
+# Селекторы открытого модального окна задания
+MODAL_SELECTORS = ["div.modal.fade.ng-scope.ng-isolate-scope.in", "div.modal.in", "div.modal.show"]
+
+# arguments[0] - селекторы модального окна, arguments[1] - сколько раз нажать ESC (по умолчанию 3).
+# Возвращает true, если модальное окно всё ещё видно
+CLOSE_MODAL_JS = """
+var done = arguments[arguments.length - 1];
+var selectors = arguments[0];
+var presses = arguments.length > 2 ? arguments[1] : 3;
+var target = document.activeElement || document.body;
+for (var i = 0; i < presses; i++) {
+    ['keydown', 'keyup'].forEach(function (type) {
+        var event = new KeyboardEvent(type, {key: 'Escape', code: 'Escape', bubbles: true});
+        // Angular-модалки смотрят на which/keyCode, а в конструкторе они не задаются
+        Object.defineProperty(event, 'keyCode', {get: function () { return 27; }});
+        Object.defineProperty(event, 'which', {get: function () { return 27; }});
+        target.dispatchEvent(event);
+    });
+}
+setTimeout(function () {
+    done(selectors.some(function (selector) {
+        var el = document.querySelector(selector);
+        return !!el && el.getClientRects().length > 0;
+    }));
+}, 1000);
+"""
+
+# Снимок модального окна задания за один вызов execute_async_script: тексты-кандидаты для всех полей
+# и фото. Разбор текстов остаётся в Python (extract_task_data)
+# arguments[0] - селекторы проблематики
+TASK_SNAPSHOT_JS = """
+var done = arguments[arguments.length - 1];
+
+function visibleText(el) {
+    return el.getClientRects().length ? (el.innerText || '').trim() : '';
+}
+function cssTexts(selector) {
+    return Array.prototype.map.call(document.querySelectorAll(selector), visibleText);
+}
+function xpathTexts(xpath) {
+    var result = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var texts = [];
+    for (var i = 0; i < result.snapshotLength; i++) {
+        texts.push(visibleText(result.snapshotItem(i)));
+    }
+    return texts;
+}
+function selectorTexts(selector) {
+    return selector.indexOf('//') === 0 ? xpathTexts(selector) : cssTexts(selector);
+}
+// Та же проверка, что и в Python: округ обычно уже есть в адресе, и тогда обход всего документа не нужен.
+// Без адреса задание битое - обход тоже пропускаем, он нашёл бы только текст списка заданий под окном
+function skipDistrictScan(texts) {
+    var address = texts.filter(function (t) { return t.length > 10 && t.indexOf(',') !== -1; })[0];
+    if (!address) {
+        return true;
+    }
+    var parts = address.split(',');
+    return parts.length > 2 && parts.some(function (p) {
+        return p.indexOf('округ') !== -1 || p.indexOf('Подольск') !== -1;
+    });
+}
+
+// Запасной вариант: перерисовка через canvas (перекодирует JPEG)
+function canvasDataUrl(img) {
+    try {
+        var canvas = document.createElement('canvas');
+        var ctx = canvas.getContext('2d');
+        canvas.width = img.naturalWidth;
+        canvas.height = img.naturalHeight;
+        ctx.drawImage(img, 0, 0);
+        return canvas.toDataURL('image/jpeg');
+    } catch(e) {
+        return null;
+    }
+}
+// Исходные байты файла с сервера: без растеризации и повторного JPEG-кодирования.
+// Зависший запрос обрываем по таймауту, иначе весь снимок теряется по таймауту скрипта
+var FETCH_TIMEOUT_MS = 10000;
+function fetchDataUrl(img) {
+    var controller = new AbortController();
+    var timer = setTimeout(function () { controller.abort(); }, FETCH_TIMEOUT_MS);
+    return fetch(img.src, {credentials: 'include', signal: controller.signal})
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.blob();
+        })
+        .then(function (blob) {
+            return new Promise(function (resolve, reject) {
+                var reader = new FileReader();
+                reader.onload = function () { resolve(reader.result); };
+                reader.onerror = reject;
+                reader.readAsDataURL(blob);
+            });
+        })
+        .catch(function () { return canvasDataUrl(img); })
+        .finally(function () { clearTimeout(timer); });
+}
+
+var addressTexts = cssTexts('td.info.ng-binding');
+var result = {
+    address: addressTexts,
+    containerTypes: cssTexts('span.wm-garbage-type.ng-binding'),
+    boldTexts: cssTexts("span[style*='font-weight: bold']"),
+    problems: arguments[0].map(selectorTexts),
+    districts: skipDistrictScan(addressTexts) ? [] :
+        xpathTexts("//*[contains(text(), 'Подольск') or contains(text(), 'округ') or contains(text(), 'Московская')]"),
+    slashTexts: xpathTexts("//*[contains(text(), '/')]"),
+    images: []
+};
+var images = Array.prototype.filter.call(document.getElementsByTagName('img'), function (img) {
+    return img.src && img.src.includes('routeTaskFileInfo');
+});
+Promise.all(images.map(fetchDataUrl)).then(function (dataUrls) {
+    result.images = dataUrls.filter(Boolean);
+    done(result);
+}, function () {
+    done(result);
+});
+"""
+
+PROBLEM_SELECTORS = [
+    "span.alert.ng-binding.ng-scope",
+    "span.alert",
+    "span.text-danger",
+    "//span[contains(text(), 'Затруднен')]",
+    "//span[contains(text(), 'проблем')]"
+]
+
+
 class ElementMonitor:
+    CYCLE_STATS_TEMPLATE = (
+        "  📈 Статистика: Всего обработано {tasks_processed}, Ошибок: {errors}\n"
+        "  📊 Сохранено в Google: {saved_to_google}, в CSV: {saved_to_csv}\n"
+        "{telegram}"
+        "  📸 Получено фото: {photos_captured}, отправлено фото: {photos_sent}\n"
+        "  🎞️ Медиагрупп: {media_groups_sent}, одиночных: {single_photos_sent}\n"
+        "  🏙️ VLOOKUP: совпадений {vlookup_matches}, пропусков {vlookup_misses}\n"
+        "  ⏳ В очереди на повтор: {retry_queue}\n"
+        "  📅 Следующий отчёт через: {next_report:.0f} сек\n"
+    )
+    CYCLE_STATS_TELEGRAM = (
+        "  📤 Отправлено в Telegram: {sent_to_telegram}\n"
+        "      Подольск: {telegram_podolsk}, Чехов: {telegram_chekhov}, Юг: {telegram_south}\n"
+    )
+
     def __init__(self):
         env_path = Path(r"C:\Users\vorop\PyCharmMiscProject\.env")
         if not env_path.exists():
@@ -434,6 +1051,9 @@ class ElementMonitor:
             'password': os.getenv('SITE_PASSWORD'),
             'site_url': os.getenv('SITE_URL').rstrip('/'),
             'monitor_interval': int(os.getenv('MONITOR_INTERVAL', '5')),  # по умолчанию 5 секунд
+            # Границы адаптивного интервала: короче после цикла с заданиями, длиннее после пустых
+            'monitor_interval_min': float(os.getenv('MONITOR_INTERVAL_MIN', '1')),
+            'monitor_interval_max': float(os.getenv('MONITOR_INTERVAL_MAX', '30')),
             'save_screenshots': os.getenv('SAVE_SCREENSHOTS', 'True').lower() == 'true',
             'headless': os.getenv('HEADLESS_MODE', 'False').lower() == 'true',
             'google_credentials': os.getenv('GOOGLE_CREDENTIALS_PATH', 'credentials.json'),
@@ -456,6 +1076,12 @@ class ElementMonitor:
 
         # Инициализация Telegram бота
         self.telegram_bot = TelegramBot(self.config['telegram_token'])
+        # Рассылка одного задания по чатам идёт параллельно; счётчики общие - под блокировкой
+        self._tg_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='tg-chat')
+        # Не больше TELEGRAM_MAX_PENDING отправок в очереди: каждая держит байты фото задания.
+        # При заполнении монитор ждёт свободного места, а не копит фото в памяти
+        self._tg_slots = threading.BoundedSemaphore(TELEGRAM_MAX_PENDING)
+        self._stats_lock = threading.Lock()
 
         # Настройка трёх чатов
         self.chat_ids = {
@@ -463,6 +1089,11 @@ class ElementMonitor:
             'chekhov': self.config.get('telegram_chat_chekhov'),
             'south': self.config.get('telegram_chat_south')
         }
+        # Обратный индекс chat_id -> ключ чата; при совпадении id приоритет у первого ключа
+        self._chat_id_to_key = {}
+        for key, chat in self.chat_ids.items():
+            if chat:
+                self._chat_id_to_key.setdefault(chat, key)
 
         enabled_chats = [key for key, chat in self.chat_ids.items() if chat]
         if enabled_chats:
@@ -479,18 +1110,26 @@ class ElementMonitor:
             'пущино': 'south',
             'протвино': 'south'
         }
+        # Все ключевые слова - одним регулярным выражением: один проход по строке вместо цикла по словам
+        self._district_re = re.compile('|'.join(re.escape(keyword) for keyword in self.district_to_chat_key))
 
         self.driver = None
         self.monitoring_active = False
-        self.processed_tasks = set()
+        # Сигнал остановки: прерывает паузы между проверками сразу, а не по их окончании
+        self._stop_event = threading.Event()
+        # Монитор работает сутками: храним только последние MAX_PROCESSED_TASKS заданий
+        self.processed_tasks = BoundedSet(MAX_PROCESSED_TASKS)
+        self.processed_history = BloomFilter(DEDUP_BLOOM_PATH, DEDUP_BLOOM_CAPACITY, DEDUP_BLOOM_ERROR_RATE)
+        _run_periodically(STORAGE_FLUSH_INTERVAL, self.processed_history.save, 'dedup-save')
         self.failed_tasks = {}
-
-        # Хранилище для отчётов
-        self.report_stats = {
-            'podolsk': defaultdict(lambda: defaultdict(int)),
-            'chekhov': defaultdict(lambda: defaultdict(int)),
-            'south': defaultdict(lambda: defaultdict(int))
-        }
+        # Очередь повторов по времени следующей попытки: (next_retry, порядковый номер, ключ задания)
+        self._retry_heap = []
+        self._retry_seq = itertools.count()
+        # id задания -> элемент из последнего разбора списка заданий
+        self._task_index = {}
+
+        # Хранилище для отчётов: (чат, водитель, ТС, проблема) -> количество
+        self.report_stats = Counter()
         self.last_report_time = datetime.now()
 
         self.google_sheets = None
@@ -499,12 +1138,18 @@ class ElementMonitor:
         if GOOGLE_SHEETS_AVAILABLE and self.config['google_sheet_url']:
             self.google_sheets = GoogleSheetManager(
                 self.config['google_credentials'],
-                self.config['google_sheet_url']
+                self.config['google_sheet_url'],
+                on_saved=self.on_sheets_saved
             )
 
         self.task_selector = "span.stand_info.ng-binding"
+        self._last_task_selector = None
+        self._last_task_hash = None
+        self._last_tasks = []
 
-        self.stats = {
+        # Counter: несколько счётчиков одного события увеличиваются одним update.
+        # Из потоков отправки обновления по-прежнему идут под _stats_lock - update не атомарен
+        self.stats = Counter({
             'total_checks': 0,
             'tasks_found': 0,
             'tasks_processed': 0,
@@ -526,7 +1171,7 @@ class ElementMonitor:
             'vlookup_matches': 0,
             'vlookup_misses': 0,
             'reports_sent': 0
-        }
+        })
 
         self.debug_dir = Path("debug_logs")
         self.debug_dir.mkdir(exist_ok=True)
@@ -535,6 +1180,9 @@ class ElementMonitor:
 
     def setup_driver(self):
         chrome_options = Options()
+        # driver.get() возвращается по DOMContentLoaded, не дожидаясь загрузки всех ресурсов;
+        # нужные элементы дальше ждём явно через WebDriverWait
+        chrome_options.page_load_strategy = 'eager'
         if self.config['headless']:
             chrome_options.add_argument('--headless')
             chrome_options.add_argument('--window-size=1920,1080')
@@ -558,8 +1206,11 @@ class ElementMonitor:
             'safebrowsing.enabled': True
         })
         try:
-            service = Service(ChromeDriverManager().install())
+            service = Service(get_chromedriver_path())
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            # Снимок задания загружает все фото в одном асинхронном скрипте
+            self.driver.set_script_timeout(60)
+            self.tune_driver_connection_pool()
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
             logger.info("WebDriver успешно инициализирован")
             return True
@@ -567,6 +1218,41 @@ class ElementMonitor:
             logger.error(f"Ошибка инициализации WebDriver: {e}")
             return False
 
+    def ensure_driver(self):
+        """Проверить, что браузер жив; пересоздать драйвер только при невосстановимой ошибке"""
+        if self.driver:
+            try:
+                _ = self.driver.title
+                return True
+            except Exception as e:
+                logger.warning(f"Сессия WebDriver потеряна ({e}), перезапускаем браузер...")
+        self.close_driver()
+        if not self.setup_driver() or not self.login():
+            logger.error("Не удалось восстановить WebDriver")
+            return False
+        self.navigate_to_monitor_page()
+        logger.info("✅ WebDriver восстановлен")
+        return True
+
+    def tune_driver_connection_pool(self):
+        # По умолчанию пул соединений с chromedriver рассчитан на одно соединение:
+        # при переполнении urllib3 закрывает лишние соединения и открывает новые
+        try:
+            executor = self.driver.command_executor
+            old_conn = getattr(executor, '_conn', None)
+            executor._conn = urllib3.PoolManager(
+                maxsize=16,
+                timeout=120,
+                # Повторяем только ошибки соединения: команды WebDriver не идемпотентны,
+                # а коды 4xx/5xx chromedriver - это обычные ответы об ошибках команд
+                retries=Retry(total=None, connect=3, read=0, redirect=0, status=0, other=0, backoff_factor=0.3)
+            )
+            if old_conn:
+                old_conn.clear()
+            logger.debug("Пул соединений с chromedriver увеличен до 16")
+        except Exception as e:
+            logger.warning(f"Не удалось настроить пул соединений с chromedriver: {e}")
+
     def login(self):
         try:
             logger.info(f"Переходим на страницу входа: {self.config['site_url']}")
@@ -606,7 +1292,7 @@ class ElementMonitor:
     def switch_to_routes_tab(self):
         try:
             routes_selectors = [
-                'label[uib-btn-radio="\'ROUTES\'"]',
+                ROUTES_TAB_SELECTOR,
                 '//label[contains(text(), "Маршруты")]',
                 '//button[contains(text(), "Маршруты")]',
                 '//a[contains(text(), "Маршруты")]'
@@ -634,53 +1320,90 @@ class ElementMonitor:
 
     def find_all_tasks(self):
         try:
+            # Если список заданий не менялся - один лёгкий запрос вместо полного разбора
+            if self._last_task_hash is not None:
+                current_hash = self.driver.execute_script(
+                    TASK_LIST_HASH_JS + "return taskListHash(document.querySelectorAll(arguments[0]));",
+                    self._last_task_selector)
+                if current_hash == self._last_task_hash:
+                    logger.info(f"Список заданий не изменился: {len(self._last_tasks)}")
+                    return self._last_tasks
+                self._last_task_hash = None
+
+            selector = self.task_selector
             try:
                 WebDriverWait(self.driver, 15).until(
                     EC.presence_of_element_located((By.CSS_SELECTOR, self.task_selector)))
             except TimeoutException:
                 alternative_selectors = ["span[ng-click*='openRouteTaskInfo']", ".stand_info", ".ng-binding[ng-click]"]
-                for selector in alternative_selectors:
+                for alt_selector in alternative_selectors:
                     try:
-                        elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
+                        elements = self.driver.find_elements(By.CSS_SELECTOR, alt_selector)
                         if elements:
-                            logger.info(f"Найдено {len(elements)} заданий по селектору: {selector}")
-                            tasks = elements
+                            logger.info(f"Найдено {len(elements)} заданий по селектору: {alt_selector}")
+                            selector = alt_selector
                             break
                     except:
                         continue
                 else:
                     logger.warning("Задания не найдены")
                     return []
-            tasks = self.driver.find_elements(By.CSS_SELECTOR, self.task_selector)
+
+            # Текст и ng-click всех заданий забираем одним запросом вместо 2 запросов на каждый элемент
+            js_script = TASK_LIST_HASH_JS + """
+            var elements = document.querySelectorAll(arguments[0]);
+            var result = [];
+            for (var i = 0; i < elements.length; i++) {
+                var el = elements[i];
+                el.__monitorSeen = true;
+                result.push({
+                    element: el,
+                    // Как .text в Selenium: у скрытых (ng-hide, свёрнутых) заданий текст пустой, они пропускаются
+                    text: el.getClientRects().length ? (el.innerText || '').trim() : '',
+                    ngClick: el.getAttribute('ng-click')
+                });
+            }
+            return {hash: taskListHash(elements), tasks: result};
+            """
+            snapshot = self.driver.execute_script(js_script, selector) or {}
+            tasks = snapshot.get('tasks') or []
             logger.info(f"Найдено заданий: {len(tasks)}")
             task_data = []
             for task in tasks:
-                try:
-                    address = task.text.strip()
-                    if address:
-                        ng_click = task.get_attribute('ng-click')
-                        task_id = None
-                        if ng_click:
-                            match = re.search(r'openRouteTaskInfo\((\d+)\)', ng_click)
-                            if match:
-                                task_id = match.group(1)
-                            else:
-                                match = re.search(r'(\d+)', ng_click)
-                                if match:
-                                    task_id = match.group(1)
-                        task_data.append({'element': task, 'address': address, 'task_id': task_id})
-                except:
+                address = task.get('text')
+                if not address:
                     continue
+                ng_click = task.get('ngClick')
+                task_id = None
+                if ng_click:
+                    match = _RE_TASK_ID.search(ng_click)
+                    if match:
+                        task_id = match.group(1)
+                    else:
+                        match = _RE_TASK_ID_FALLBACK.search(ng_click)
+                        if match:
+                            task_id = match.group(1)
+                task_data.append({
+                    'element': TaskElement(task['element'], task_id, self.locate_task_element),
+                    'address': address,
+                    'task_id': task_id
+                })
+
+            self._last_task_selector = selector
+            self._last_task_hash = snapshot.get('hash')
+            self._last_tasks = task_data
+            self._task_index = {task['task_id']: task['element'] for task in task_data if task['task_id']}
             return task_data
         except Exception as e:
             logger.error(f"Ошибка при поиске заданий: {e}")
             return []
 
+    def locate_task_element(self, task_id):
+        return self.driver.find_element(By.CSS_SELECTOR, f"[ng-click*='openRouteTaskInfo({task_id})']")
+
     # ---------- ОТКРЫТИЕ МОДАЛЬНОГО ОКНА С ПОВТОРНЫМИ ПОПЫТКАМИ ----------
     def open_task_modal(self, task_element, retries=3):
         """Открытие модального окна с повторными попытками при неудаче"""
-        modal_selectors = ["div.modal.fade.ng-scope.ng-isolate-scope.in", "div.modal.in", "div.modal.show"]
-
         for attempt in range(retries):
             try:
                 logger.info(f"Попытка {attempt + 1} открыть модальное окно...")
@@ -688,7 +1411,7 @@ class ElementMonitor:
                 time.sleep(3)
 
                 # Проверяем, открылось ли окно
-                for selector in modal_selectors:
+                for selector in MODAL_SELECTORS:
                     try:
                         WebDriverWait(self.driver, 5).until(
                             EC.presence_of_element_located((By.CSS_SELECTOR, selector))
@@ -703,11 +1426,10 @@ class ElementMonitor:
                 self.press_esc_to_close_modal()
                 time.sleep(2)
 
-            except StaleElementReferenceException:
-                logger.warning(f"Элемент задания устарел при попытке {attempt + 1}, пробуем найти заново")
-                # Пытаемся обновить элемент – в данном контексте это сложно, просто пробуем снова с тем же элементом
-                self.press_esc_to_close_modal()
-                time.sleep(2)
+            except (NoSuchElementException, StaleElementReferenceException):
+                # TaskElement уже пытался найти задание заново - повторять клик бессмысленно
+                logger.warning("Задание больше не найдено на странице")
+                return False
             except Exception as e:
                 logger.warning(f"Ошибка при попытке {attempt + 1}: {e}")
                 self.press_esc_to_close_modal()
@@ -717,6 +1439,10 @@ class ElementMonitor:
         return False
 
     # ---------- ИЗВЛЕЧЕНИЕ ДАННЫХ ----------
+    def get_page_text(self):
+        """Видимый текст страницы: в разы меньше page_source и без сериализации DOM"""
+        return self.driver.execute_script("return document.body ? document.body.innerText : '';") or ''
+
     def extract_task_data(self):
         data = {
             'address': '',
@@ -728,110 +1454,88 @@ class ElementMonitor:
             'photos_data': []
         }
 
-        # Адрес
+        # Все тексты и фото модального окна - одним запросом к браузеру
         try:
-            address_elements = self.driver.find_elements(By.CSS_SELECTOR, "td.info.ng-binding")
-            for elem in address_elements:
-                text = elem.text.strip()
-                if text and len(text) > 10 and ',' in text:
-                    data['address'] = text
-                    break
+            snapshot = self.driver.execute_async_script(TASK_SNAPSHOT_JS, PROBLEM_SELECTORS) or {}
         except Exception as e:
-            logger.warning(f"Не удалось извлечь адрес: {e}")
+            logger.warning(f"Не удалось получить данные модального окна: {e}")
+            snapshot = {}
+        # Видимый текст страницы для запасных вариантов - запрашивается не больше одного раза
+        page_text = None
+
+        # Адрес
+        for text in snapshot.get('address', []):
+            if text and len(text) > 10 and ',' in text:
+                data['address'] = text
+                break
 
         # Тип тары
         try:
-            container_spans = self.driver.find_elements(By.CSS_SELECTOR, "span.wm-garbage-type.ng-binding")
-            if container_spans:
-                data['container_type'] = container_spans[0].text.strip()
-            bold_spans = self.driver.find_elements(By.CSS_SELECTOR, "span[style*='font-weight: bold']")
-            for span in bold_spans:
-                if span.text.strip():
+            container_types = snapshot.get('containerTypes', [])
+            if container_types:
+                data['container_type'] = container_types[0]
+            for text in snapshot.get('boldTexts', []):
+                if text:
                     if data['container_type']:
-                        data['container_type'] = f"{span.text.strip()} ({data['container_type']})"
+                        data['container_type'] = f"{text} ({data['container_type']})"
                     else:
-                        data['container_type'] = span.text.strip()
+                        data['container_type'] = text
                     break
-            if not data['container_type'] and 'ТБО' in self.driver.page_source:
-                data['container_type'] = 'ТБО'
+            if not data['container_type']:
+                page_text = self.get_page_text()
+                if 'ТБО' in page_text:
+                    data['container_type'] = 'ТБО'
         except:
             pass
 
         # Проблематика
-        try:
-            problem_selectors = [
-                "span.alert.ng-binding.ng-scope",
-                "span.alert",
-                "span.text-danger",
-                "//span[contains(text(), 'Затруднен')]",
-                "//span[contains(text(), 'проблем')]"
-            ]
-            for selector in problem_selectors:
-                try:
-                    if selector.startswith('//'):
-                        problem_elements = self.driver.find_elements(By.XPATH, selector)
+        for problem_texts in snapshot.get('problems', []):
+            for text in problem_texts:
+                if text and len(text) > 3:
+                    first_line = text.split('\n')[0].strip()
+                    if _RE_DISPATCHER_LINE.search(first_line):
+                        parts = first_line.split(' ')
+                        problem_text = ' '.join([p for p in parts if not _RE_DISPATCHER_WORD.search(p)])
                     else:
-                        problem_elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                    for elem in problem_elements:
-                        text = elem.text.strip()
-                        if text and len(text) > 3:
-                            first_line = text.split('\n')[0].strip()
-                            if 'Асланов' in first_line or 'И. Х.' in first_line:
-                                parts = first_line.split(' ')
-                                problem_text = ' '.join(
-                                    [p for p in parts if not any(name in p for name in ['Асланов', 'И.', 'Х.'])])
-                            else:
-                                problem_text = first_line
-                            data['problem'] = problem_text.upper()
-                            break
-                    if data['problem']:
+                        problem_text = first_line
+                    data['problem'] = problem_text.upper()
+                    break
+            if data['problem']:
+                break
+
+        # Городской округ (запасной вариант): сначала из адреса, XPath по странице - только если не нашли
+        if data['address']:
+            address_parts = data['address'].split(',')
+            if len(address_parts) > 2:
+                for part in address_parts:
+                    if 'округ' in part or 'Подольск' in part:
+                        data['city_district'] = part.strip()
                         break
-                except:
-                    continue
-        except:
-            pass
-
-        # Городской округ (запасной вариант)
-        try:
-            all_elements = self.driver.find_elements(By.XPATH,
-                                                     "//*[contains(text(), 'Подольск') or contains(text(), 'округ') or contains(text(), 'Московская')]")
-            for elem in all_elements:
-                text = elem.text.strip()
+        if data['address'] and not data['city_district']:
+            for text in snapshot.get('districts', []):
                 if text and 3 < len(text) < 50:
                     data['city_district'] = text
                     break
-            if not data['city_district'] and data['address']:
-                address_parts = data['address'].split(',')
-                if len(address_parts) > 2:
-                    for part in address_parts:
-                        if 'округ' in part or 'Подольск' in part:
-                            data['city_district'] = part.strip()
-                            break
-        except:
-            pass
 
         # ФИО и ТС
         try:
             logger.info("Поиск ФИО и ТС...")
-            elements_with_slash = self.driver.find_elements(By.XPATH, "//*[contains(text(), '/')]")
-            for elem in elements_with_slash:
-                text = elem.text.strip()
+            for text in snapshot.get('slashTexts', []):
                 if text and '/' in text:
-                    text = ' '.join(text.split())
-                    if re.search(r'[А-Я]\d{3}[А-Я]{2}\d{2,3}', text) or re.search(r'[А-Я]\d{3}[А-Я]\d{2,3}', text):
+                    text = collapse_whitespace(text)
+                    if _RE_PLATE.search(text):
                         parts = text.split('/')
                         if len(parts) == 2:
                             vehicle_part = parts[0].strip()
                             driver_part = parts[1].strip()
-                            vehicle_match = re.search(r'([А-Я]\d{3}[А-Я]{2}\d{2,3}|[А-Я]\d{3}[А-Я]\d{2,3})',
-                                                      vehicle_part)
+                            vehicle_match = _RE_PLATE.search(vehicle_part)
                             if vehicle_match:
-                                data['vehicle'] = vehicle_match.group(1)
+                                data['vehicle'] = vehicle_match.group(0)
                             else:
                                 data['vehicle'] = vehicle_part.split()[0] if vehicle_part else ''
-                            name_match = re.search(r'([А-Я][а-яё]+ [А-Я]\. ?[А-Я]\.)', driver_part)
+                            name_match = _RE_DRIVER_NAME.search(driver_part)
                             if name_match:
-                                data['driver_name'] = name_match.group(1)
+                                data['driver_name'] = name_match.group(0)
                             else:
                                 name_words = driver_part.split()
                                 if len(name_words) >= 3:
@@ -841,59 +1545,40 @@ class ElementMonitor:
                             logger.info(f"✅ Найдены: ТС={data['vehicle']}, ФИО={data['driver_name']}")
                             break
             if not data.get('vehicle') or not data.get('driver_name'):
+                if page_text is None:
+                    page_text = self.get_page_text()
                 if not data.get('vehicle'):
-                    vehicle_patterns = [r'[А-Я]\d{3}[А-Я]{2}\d{2,3}', r'[А-Я]\d{3}[А-Я]\d{2,3}']
-                    for pat in vehicle_patterns:
-                        m = re.search(pat, self.driver.page_source)
-                        if m:
-                            data['vehicle'] = m.group(0)
-                            break
+                    m = _RE_PLATE.search(page_text)
+                    if m:
+                        data['vehicle'] = m.group(0)
                 if not data.get('driver_name'):
-                    name_patterns = [r'[А-Я][а-яё]+ [А-Я]\. [А-Я]\.', r'[А-Я][а-яё]+ [А-Я]\.[А-Я]\.']
-                    for pat in name_patterns:
-                        m = re.search(pat, self.driver.page_source)
-                        if m:
-                            data['driver_name'] = m.group(0)
-                            break
+                    m = _RE_DRIVER_NAME.search(page_text)
+                    if m:
+                        data['driver_name'] = m.group(0)
             logger.info(f"Результат: ТС='{data.get('vehicle', '')}', ФИО='{data.get('driver_name', '')}'")
         except Exception as e:
             logger.warning(f"Не удалось извлечь ФИО и ТС: {e}")
 
-        # ---------- ИЗВЛЕЧЕНИЕ ФОТО ТОЛЬКО ЧЕРЕЗ CANVAS ----------
+        # ---------- ФОТО (ПОЛУЧЕНЫ В СНИМКЕ ВЫШЕ) ----------
         try:
-            logger.info("Извлечение фото через canvas (JavaScript)...")
-            js_script = """
-            var images = document.getElementsByTagName('img');
-            var imageData = [];
-            for (var i = 0; i < images.length; i++) {
-                var img = images[i];
-                if (img.src && img.src.includes('routeTaskFileInfo')) {
-                    try {
-                        var canvas = document.createElement('canvas');
-                        var ctx = canvas.getContext('2d');
-                        canvas.width = img.naturalWidth;
-                        canvas.height = img.naturalHeight;
-                        ctx.drawImage(img, 0, 0);
-                        var dataUrl = canvas.toDataURL('image/jpeg');
-                        imageData.push(dataUrl);
-                    } catch(e) {}
-                }
-            }
-            return imageData;
-            """
-            base64_images = self.driver.execute_script(js_script)
+            # Забираем строки из снимка и отпускаем каждую сразу после декодирования:
+            # в памяти не лежат одновременно все base64 и все байты фото
+            base64_images = snapshot.pop('images', None)
             if base64_images:
-                logger.info(f"Найдено {len(base64_images)} изображений через canvas")
+                logger.info(f"Найдено {len(base64_images)} изображений")
+                photo_prefix = f"photo_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
                 for i, base64_img in enumerate(base64_images):
+                    base64_images[i] = None
                     try:
-                        if ',' in base64_img:
-                            base64_data = base64_img.split(',')[1]
-                            photo_data = base64.b64decode(base64_data)
+                        header_end = base64_img.find(',')
+                        if header_end != -1:
+                            # a2b_base64 принимает str напрямую: без промежуточной ASCII-копии, как в b64decode
+                            photo_data = binascii.a2b_base64(base64_img[header_end + 1:])
                             if len(photo_data) > 1024:
                                 data['photos_data'].append(photo_data)
                                 self.stats['photos_captured'] += 1
                                 if self.config['save_photos_locally']:
-                                    photo_filename = f"canvas_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{i}.jpg"
+                                    photo_filename = f"{photo_prefix}_{i}.jpg"
                                     photo_path = self.photos_dir / photo_filename
                                     with open(photo_path, 'wb') as f:
                                         f.write(photo_data)
@@ -905,18 +1590,17 @@ class ElementMonitor:
                         logger.warning(f"Ошибка декодирования фото {i + 1}: {e}")
                         self.stats['photos_failed'] += 1
             else:
-                logger.info("Фото через canvas не найдены")
+                logger.info("Фото не найдены")
                 self.stats['photos_failed'] += 1
         except Exception as e:
-            logger.error(f"Ошибка при извлечении фото через canvas: {e}")
+            logger.error(f"Ошибка при извлечении фото: {e}")
 
         logger.info(f"Всего извлечено фото: {len(data['photos_data'])}")
         return data
 
     # ---------- ОПРЕДЕЛЕНИЕ ЦЕЛЕВЫХ ЧАТОВ ----------
     def get_target_chats(self, district):
-        if not district or district == '':
-            logger.warning("Городской округ не определен, задание не будет отправлено в Telegram")
+        if not district:
             return []
 
         district_lower = district.lower()
@@ -929,14 +1613,14 @@ class ElementMonitor:
                     chats.append(self.chat_ids[key])
             return chats
 
-        for keyword, chat_key in self.district_to_chat_key.items():
-            if keyword in district_lower:
-                chat_id = self.chat_ids.get(chat_key)
-                if chat_id:
-                    return [chat_id]
-                else:
-                    logger.warning(f"Чат для округа '{district}' не настроен, задание не будет отправлено")
-                    return []
+        match = self._district_re.search(district_lower)
+        if match:
+            chat_id = self.chat_ids.get(self.district_to_chat_key[match.group(0)])
+            if chat_id:
+                return [chat_id]
+            else:
+                logger.warning(f"Чат для округа '{district}' не настроен, задание не будет отправлено")
+                return []
 
         logger.warning(f"Городской округ '{district}' не распознан, задание не будет отправлено в Telegram")
         return []
@@ -954,14 +1638,15 @@ class ElementMonitor:
             if task_data.get('city_district'):
                 lines.append(f"🏙️ Городской округ: {task_data['city_district']}")
             if task_data.get('driver_name'):
-                driver_name = ' '.join(task_data['driver_name'].split())
+                driver_name = collapse_whitespace(task_data['driver_name'])
                 lines.append(f"👤 ФИО: {driver_name}")
             if task_data.get('vehicle'):
                 lines.append(f"🚛 ТС: {task_data['vehicle']}")
             photos_count = len(task_data.get('photos_data', []))
             if photos_count > 0:
                 lines.append(f"📸 Фото: {photos_count} шт.")
-            lines.append(f"\n⏰ Обработано: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            # Отметка времени уже поставлена при сохранении задания
+            lines.append(f"\n⏰ Обработано: {task_data.get('timestamp') or datetime.now().strftime(TIMESTAMP_FORMAT)}")
             return '\n'.join(lines)
         except Exception as e:
             logger.error(f"Ошибка форматирования сообщения: {e}")
@@ -971,42 +1656,38 @@ class ElementMonitor:
         if not self.telegram_bot.enabled or not chat_id:
             return False
         try:
-            valid_photos = []
-            for i, pd in enumerate(photos_data):
-                if pd and len(pd) > 1024:
-                    valid_photos.append(pd)
-                else:
-                    logger.warning(f"Фото {i + 1} невалидно, пропуск")
+            # Размер фото уже проверен при захвате в extract_task_data
+            valid_photos = photos_data
             if not valid_photos:
                 return False
 
             if self.config['send_media_group'] and len(valid_photos) > 1:
                 logger.info(f"Отправка {len(valid_photos)} фото медиагруппой в чат {chat_id}...")
-                success = self.telegram_bot.send_media_group_bytes_to_chat(chat_id, valid_photos, caption)
+                success = self.telegram_bot.send_media_group_now(chat_id, valid_photos, caption)
                 if success:
-                    self.stats['media_groups_sent'] += 1
-                    self.stats['photos_sent'] += len(valid_photos)
+                    with self._stats_lock:
+                        self.stats.update(media_groups_sent=1, photos_sent=len(valid_photos))
                 return success
             else:
                 if len(valid_photos) == 1:
-                    success = self.telegram_bot.send_photo_bytes_to_chat(chat_id, valid_photos[0], caption=caption)
+                    success = self.telegram_bot.send_photo_now(chat_id, valid_photos[0], caption=caption)
                     if success:
-                        self.stats['single_photos_sent'] += 1
-                        self.stats['photos_sent'] += 1
+                        with self._stats_lock:
+                            self.stats.update(single_photos_sent=1, photos_sent=1)
                     return success
                 else:
                     all_ok = True
-                    success = self.telegram_bot.send_photo_bytes_to_chat(chat_id, valid_photos[0], caption=caption)
+                    success = self.telegram_bot.send_photo_now(chat_id, valid_photos[0], caption=caption)
                     if success:
-                        self.stats['single_photos_sent'] += 1
-                        self.stats['photos_sent'] += 1
+                        with self._stats_lock:
+                            self.stats.update(single_photos_sent=1, photos_sent=1)
                     else:
                         all_ok = False
                     for pd in valid_photos[1:]:
                         time.sleep(0.5)
-                        if self.telegram_bot.send_photo_bytes_to_chat(chat_id, pd):
-                            self.stats['single_photos_sent'] += 1
-                            self.stats['photos_sent'] += 1
+                        if self.telegram_bot.send_photo_now(chat_id, pd):
+                            with self._stats_lock:
+                                self.stats.update(single_photos_sent=1, photos_sent=1)
                         else:
                             all_ok = False
                     return all_ok
@@ -1015,123 +1696,131 @@ class ElementMonitor:
             return False
 
     def send_to_telegram(self, task_data):
+        """Ставит отправку задания во все целевые чаты в очередь; возвращает список Future (пустой - некуда отправлять)"""
         try:
+            district = task_data.get('city_district', '')
+            if not district:
+                logger.warning("Городской округ не определен, задание не будет отправлено в Telegram")
+                return []
+
             message = self.format_telegram_message(task_data)
             photos_data = task_data.get('photos_data', [])
-            district = task_data.get('city_district', '')
 
             target_chats = self.get_target_chats(district)
             if not target_chats:
                 logger.info("Нет целевых чатов для отправки, пропускаем отправку в Telegram")
-                return False
+                return []
 
-            telegram_sent = False
+            futures = []
             for chat_id in target_chats:
                 if not chat_id:
                     continue
+                self._tg_slots.acquire()
                 try:
-                    if photos_data:
-                        success = self.send_photos_with_caption_to_chat(chat_id, photos_data, message)
-                        if success:
-                            self.stats['sent_to_telegram'] += 1
-                            telegram_sent = True
-                            if chat_id == self.chat_ids['podolsk']:
-                                self.stats['telegram_podolsk'] += 1
-                                self.add_to_report('podolsk', task_data)
-                            elif chat_id == self.chat_ids['chekhov']:
-                                self.stats['telegram_chekhov'] += 1
-                                self.add_to_report('chekhov', task_data)
-                            elif chat_id == self.chat_ids['south']:
-                                self.stats['telegram_south'] += 1
-                                self.add_to_report('south', task_data)
-                    else:
-                        success = self.telegram_bot.send_message_to_chat(chat_id, message)
-                        if success:
-                            self.stats['sent_to_telegram'] += 1
-                            telegram_sent = True
-                            if chat_id == self.chat_ids['podolsk']:
-                                self.stats['telegram_podolsk'] += 1
-                                self.add_to_report('podolsk', task_data)
-                            elif chat_id == self.chat_ids['chekhov']:
-                                self.stats['telegram_chekhov'] += 1
-                                self.add_to_report('chekhov', task_data)
-                            elif chat_id == self.chat_ids['south']:
-                                self.stats['telegram_south'] += 1
-                                self.add_to_report('south', task_data)
-                except Exception as e:
-                    logger.error(f"Ошибка отправки в чат {chat_id}: {e}")
-
-            return telegram_sent
+                    future = self._tg_pool.submit(self._send_one_chat, chat_id, photos_data, message, task_data)
+                except Exception:
+                    self._tg_slots.release()
+                    raise
+                future.add_done_callback(lambda _: self._tg_slots.release())
+                futures.append(future)
+            return futures
         except Exception as e:
             logger.error(f"Ошибка отправки в Telegram: {e}")
+            return []
+
+    def _send_one_chat(self, chat_id, photos_data, message, task_data):
+        try:
+            if photos_data:
+                success = self.send_photos_with_caption_to_chat(chat_id, photos_data, message)
+            else:
+                success = self.telegram_bot.send_message_now(chat_id, message)
+            if success:
+                key = self._chat_id_to_key.get(chat_id)
+                with self._stats_lock:
+                    if key:
+                        self.stats.update({'sent_to_telegram': 1, f'telegram_{key}': 1})
+                        self.add_to_report(key, task_data)
+                    else:
+                        self.stats['sent_to_telegram'] += 1
+            return success
+        except Exception as e:
+            logger.error(f"Ошибка отправки в чат {chat_id}: {e}")
             return False
 
     def add_to_report(self, chat_key, task_data):
         driver = task_data.get('driver_name', 'Неизвестно')
         vehicle = task_data.get('vehicle', 'Неизвестно')
         problem = task_data.get('problem', 'Не указана')
-        key = (driver, vehicle)
-        self.report_stats[chat_key][key][problem] += 1
+        self.report_stats[(chat_key, driver, vehicle, problem)] += 1
 
     # ---------- ОТПРАВКА ОТЧЁТА ----------
     def send_reports(self):
         logger.info("Формирование периодических отчётов...")
         print("\n  📊 Формирование отчётов за последние 3 часа...")
 
+        with self._stats_lock:
+            report_stats = self.report_stats
+            self.report_stats = Counter()
+
+        # Группировка по чату и водителю в порядке появления заданий
+        grouped = {}
+        for (chat_key, driver, vehicle, problem), count in report_stats.items():
+            grouped.setdefault(chat_key, {}).setdefault((driver, vehicle), []).append((problem, count))
+
+        period = f"{self.last_report_time.strftime(TIMESTAMP_FORMAT)} – {datetime.now().strftime(TIMESTAMP_FORMAT)}"
+
+        # Отчёты во все чаты уходят одновременно
+        report_keys = []
+        calls = []
         for chat_key, chat_id in self.chat_ids.items():
             if not chat_id:
                 continue
 
-            stats = self.report_stats[chat_key]
+            stats = grouped.get(chat_key)
             if not stats:
                 report_text = (
                     f"<b>📊 ОТЧЁТ ЗА ПЕРИОД</b>\n\n"
-                    f"<i>{self.last_report_time.strftime('%Y-%m-%d %H:%M:%S')} – {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</i>\n\n"
+                    f"<i>{period}</i>\n\n"
                     f"За указанный период не было обработано ни одного задания."
                 )
             else:
                 lines = [
                     f"<b>📊 ОТЧЁТ ЗА ПЕРИОД</b>",
-                    f"<i>{self.last_report_time.strftime('%Y-%m-%d %H:%M:%S')} – {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</i>\n"
+                    f"<i>{period}</i>\n"
                 ]
 
                 for (driver, vehicle), problems in stats.items():
                     lines.append(f"<b>{driver}</b> ({vehicle}):")
-                    for problem, count in problems.items():
+                    for problem, count in problems:
                         lines.append(f"  • {problem}: {count}")
                     lines.append("")
 
                 report_text = "\n".join(lines)
 
-            self.telegram_bot.send_message_to_chat(chat_id, report_text)
-            logger.info(f"✅ Отчёт отправлен в чат {chat_key}")
-            self.stats['reports_sent'] += 1
+            report_keys.append(chat_key)
+            calls.append((self.telegram_bot.send_message_to_chat, (chat_id, report_text)))
+
+        for chat_key, sent in zip(report_keys, self.telegram_bot.send_batch(calls)):
+            if sent:
+                logger.info(f"✅ Отчёт отправлен в чат {chat_key}")
+                self.stats['reports_sent'] += 1
+            else:
+                logger.warning(f"Отчёт в чат {chat_key} не отправлен")
 
-        self.report_stats = {
-            'podolsk': defaultdict(lambda: defaultdict(int)),
-            'chekhov': defaultdict(lambda: defaultdict(int)),
-            'south': defaultdict(lambda: defaultdict(int))
-        }
         self.last_report_time = datetime.now()
 
     # ---------- ЗАКРЫТИЕ МОДАЛЬНОГО ОКНА ----------
     def press_esc_to_close_modal(self):
         try:
-            for _ in range(3):
-                try:
-                    self.driver.switch_to.active_element.send_keys(Keys.ESCAPE)
-                except:
-                    self.driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
-                time.sleep(0.5)
-            time.sleep(1)
-            modal_selectors = ["div.modal.fade.ng-scope.ng-isolate-scope.in", "div.modal.in", "div.modal.show"]
-            for sel in modal_selectors:
-                try:
-                    if self.driver.find_element(By.CSS_SELECTOR, sel).is_displayed():
-                        logger.warning("Модальное окно не закрылось после ESC")
-                        return False
-                except:
-                    pass
+            # ESC и проверка модального окна за один вызов: ждём секунду на анимацию закрытия внутри браузера
+            if not self.driver.execute_async_script(CLOSE_MODAL_JS, MODAL_SELECTORS):
+                logger.info("✅ Модальное окно закрыто ESC")
+                return True
+            # Синтетическое событие не сработало - отправляем настоящую клавишу
+            self.driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
+            if self.driver.execute_async_script(CLOSE_MODAL_JS, MODAL_SELECTORS, 0):
+                logger.warning("Модальное окно не закрылось после ESC")
+                return False
             logger.info("✅ Модальное окно закрыто ESC")
             return True
         except Exception as e:
@@ -1139,55 +1828,69 @@ class ElementMonitor:
             return False
 
     # ---------- СОХРАНЕНИЕ ДАННЫХ ----------
+    def on_sheets_saved(self, rows, vlookup_matches):
+        # Вызывается из потока сброса Google Таблицы
+        with self._stats_lock:
+            self.stats.update(saved_to_google=rows, vlookup_matches=vlookup_matches,
+                              vlookup_misses=rows - vlookup_matches)
+
     def save_task_data(self, task_data):
         success_google = False
         success_csv = False
 
+        # Одна отметка времени на задание - одинаковая в CSV и Google Таблице
+        now = datetime.now()
+        task_data['timestamp'] = now.strftime(TIMESTAMP_FORMAT)
+
         if task_data.get('photos_data'):
             task_data['photos_str'] = f"Canvas: {len(task_data['photos_data'])} фото"
         else:
             task_data['photos_str'] = 'Нет фото'
 
         if self.google_sheets and self.google_sheets.worksheet:
+            # Строка только встаёт в очередь: saved_to_google считается в on_sheets_saved после записи
             if self.google_sheets.add_row(task_data):
                 success_google = True
-                self.stats['saved_to_google'] += 1
-                if task_data.get('city_district') and task_data.get('city_district') != task_data.get(
-                        '_original_city_district', ''):
-                    self.stats['vlookup_matches'] += 1
-                else:
-                    self.stats['vlookup_misses'] += 1
 
         if self.csv_manager.add_row(task_data):
             success_csv = True
             self.stats['saved_to_csv'] += 1
 
         try:
-            filename = f"backup_{datetime.now().strftime('%Y%m%d')}.json"
-            task_data['backup_timestamp'] = datetime.now().isoformat()
+            filename = f"backup_{now.strftime('%Y%m%d')}.jsonl"
+            task_data['backup_timestamp'] = now.isoformat()
             json_data = task_data.copy()
             if 'photos_data' in json_data:
                 json_data['photos_count'] = len(json_data['photos_data'])
                 del json_data['photos_data']
-            existing = []
-            if Path(filename).exists():
-                with open(filename, 'r', encoding='utf-8') as f:
-                    existing = json.load(f)
-            existing.append(json_data)
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(existing, f, ensure_ascii=False, indent=2)
+            # JSON Lines: одна строка на задание, файл только дописывается
+            with open(filename, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(json_data, ensure_ascii=False) + '\n')
         except Exception as e:
             logger.warning(f"Не удалось сохранить JSON: {e}")
 
         return success_google or success_csv
 
     # ---------- ОБРАБОТКА ЗАДАНИЯ ----------
+    @staticmethod
+    def make_task_key(task_info):
+        # id задания однозначно определяет задание; адрес - только если id не удалось извлечь.
+        # id хранится как int: меньше памяти в processed_tasks и хэш без прохода по строке
+        task_id = task_info.get('task_id')
+        if task_id:
+            return int(task_id) if task_id.isdigit() else task_id
+        return task_info.get('address', 'Без адреса')
+
+    def is_processed(self, task_key):
+        # Сначала точное множество текущего запуска, затем история с диска (задания до перезапуска)
+        return self.processed_tasks.touch(task_key) or task_key in self.processed_history
+
     def process_task(self, task_info, is_retry=False):
         task_id = task_info.get('task_id', 'unknown')
         address = task_info.get('address', 'Без адреса')
-        task_key = f"{task_id}_{hash(address)}"
+        task_key = self.make_task_key(task_info)
 
-        if task_key in self.processed_tasks:
+        if self.is_processed(task_key):
             logger.info(f"Задание {task_id} уже обработано, пропускаем")
             return False
 
@@ -1202,24 +1905,23 @@ class ElementMonitor:
 
             task_data = self.extract_task_data()
             task_data['task_id'] = task_id
-            task_data['_original_city_district'] = task_data.get('city_district', '')
 
             photos_ok = len(task_data.get('photos_data', [])) > 0
 
             if not photos_ok:
                 logger.warning(f"Задание {task_id}: фото не получены")
                 if is_retry:
-                    logger.error(
-                        f"Задание {task_id} не удалось обработать после повторных попыток, помечаем как перманентную ошибку")
-                    self.stats['tasks_failed_permanent'] += 1
+                    # Задание остаётся в очереди: следующий срок и лимит попыток считает retry_failed_tasks,
+                    # там же оно учитывается как перманентная ошибка
+                    logger.warning(f"Задание {task_id}: повторная попытка не удалась")
                     self.press_esc_to_close_modal()
                     return False
                 else:
-                    self.failed_tasks[task_key] = {
-                        'attempts': self.failed_tasks.get(task_key, {}).get('attempts', 0) + 1,
-                        'last_seen': time.time(),
-                        'task_info': task_info
-                    }
+                    fail_info = self.failed_tasks.setdefault(task_key, {'attempts': 0})
+                    fail_info['attempts'] += 1
+                    fail_info['last_seen'] = time.time()
+                    fail_info['task_info'] = task_info
+                    self.schedule_retry(task_key, fail_info)
                     logger.info(
                         f"Задание {task_id} добавлено в список на повторную проверку (попытка {self.failed_tasks[task_key]['attempts']})")
                     self.press_esc_to_close_modal()
@@ -1230,22 +1932,24 @@ class ElementMonitor:
                     self.press_esc_to_close_modal()
                     return False
 
-                telegram_sent = False
+                # Отправка в Telegram идёт в фоне: тем временем окно закрывается и берётся следующее задание.
+                # Байты фото освобождаются вместе с задачами отправки
+                telegram_futures = []
                 if self.telegram_bot.enabled:
-                    telegram_sent = self.send_to_telegram(task_data)
-                    task_data['telegram_sent'] = 'Да' if telegram_sent else 'Нет'
+                    telegram_futures = self.send_to_telegram(task_data)
+                    task_data['telegram_sent'] = 'Отправляется' if telegram_futures else 'Нет'
                 else:
                     task_data['telegram_sent'] = 'Бот отключен'
+                photos_count = len(task_data['photos_data'])
 
                 self.press_esc_to_close_modal()
 
                 self.processed_tasks.add(task_key)
+                self.processed_history.add(task_key)
                 if task_key in self.failed_tasks:
                     del self.failed_tasks[task_key]
 
-                self.stats['tasks_processed'] += 1
-                if is_retry:
-                    self.stats['tasks_retried'] += 1
+                self.stats.update(tasks_processed=1, tasks_retried=int(is_retry))
 
                 logger.info(f"✅ Задание {task_id} успешно обработано")
                 print(f"    ✅ Обработано")
@@ -1256,9 +1960,9 @@ class ElementMonitor:
                 if task_data.get('problem'):
                     print(f"    ⚠️  {task_data['problem'][:40]}...")
                 print(f"    🏙️ Округ: {task_data.get('city_district', 'Не определен')}")
-                print(f"    📸 Получено фото: {len(task_data.get('photos_data', []))}")
-                if telegram_sent:
-                    print(f"    📤 Отправлено в Telegram")
+                print(f"    📸 Получено фото: {photos_count}")
+                if telegram_futures:
+                    print(f"    📤 Отправка в Telegram: {len(telegram_futures)} чат(ов)")
                 return True
 
         except Exception as e:
@@ -1270,14 +1974,33 @@ class ElementMonitor:
                 pass
             return False
 
+    def schedule_retry(self, task_key, fail_info):
+        delay = min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** (fail_info['attempts'] - 1))
+        fail_info['next_retry'] = time.time() + delay
+        heapq.heappush(self._retry_heap, (fail_info['next_retry'], next(self._retry_seq), task_key))
+
     def retry_failed_tasks(self):
-        if not self.failed_tasks:
-            return
+        # Из кучи берутся только задания, чей срок повтора наступил; остальные не просматриваются
         current_time = time.time()
+        due = []
+        while self._retry_heap and self._retry_heap[0][0] <= current_time:
+            next_retry, _, task_key = heapq.heappop(self._retry_heap)
+            fail_info = self.failed_tasks.get(task_key)
+            # Устаревшая запись: задание уже обработано, удалено или перепланировано
+            if fail_info is None or fail_info['next_retry'] != next_retry:
+                continue
+            due.append((task_key, fail_info))
+        if not due:
+            return
         tasks_to_remove = []
-        logger.info(f"Попытка повторной обработки {len(self.failed_tasks)} заданий...")
-        print(f"\n  🔄 Повторная обработка {len(self.failed_tasks)} заданий...")
-        for task_key, fail_info in list(self.failed_tasks.items()):
+        logger.info(f"Попытка повторной обработки {len(due)} из {len(self.failed_tasks)} заданий...")
+        print(f"\n  🔄 Повторная обработка {len(due)} заданий...")
+        for i, (task_key, fail_info) in enumerate(due):
+            if self._stop_event.is_set():
+                # Остановка: непросмотренные задания возвращаем в кучу с прежним сроком
+                for key, info in due[i:]:
+                    heapq.heappush(self._retry_heap, (info['next_retry'], next(self._retry_seq), key))
+                break
             if fail_info['attempts'] >= self.config['max_retry_attempts']:
                 logger.warning(
                     f"Задание {task_key} превысило лимит попыток ({self.config['max_retry_attempts']}), удаляем из очереди")
@@ -1289,46 +2012,46 @@ class ElementMonitor:
                 tasks_to_remove.append(task_key)
                 continue
             task_info = fail_info['task_info']
-            try:
-                task_info['element'].is_displayed()
-                self.process_task(task_info, is_retry=True)
-            except StaleElementReferenceException:
-                logger.warning(f"Элемент задания {task_key} устарел, пробуем найти заново")
-                new_task = self.find_task_by_id(task_info.get('task_id'))
-                if new_task:
-                    task_info['element'] = new_task
-                    self.process_task(task_info, is_retry=True)
-                else:
-                    logger.warning(f"Не удалось найти задание {task_key} на странице")
-                    tasks_to_remove.append(task_key)
+            # Свежий элемент из последнего разбора списка - без клика по устаревшему и повторного поиска.
+            # Если задания в списке нет, устаревший элемент TaskElement находит заново сам при клике
+            fresh_element = self._task_index.get(task_info.get('task_id'))
+            if fresh_element is not None:
+                task_info['element'] = fresh_element
+            self.process_task(task_info, is_retry=True)
+            if task_info['element'].gone:
+                logger.warning(f"Не удалось найти задание {task_key} на странице")
+                tasks_to_remove.append(task_key)
+            elif self.failed_tasks.get(task_key) is fail_info:
+                # Повтор не удался - следующая попытка позже
+                fail_info['attempts'] += 1
+                self.schedule_retry(task_key, fail_info)
         for key in tasks_to_remove:
             if key in self.failed_tasks:
                 del self.failed_tasks[key]
 
-    def find_task_by_id(self, task_id):
-        if not task_id:
-            return None
-        tasks = self.find_all_tasks()
-        for task in tasks:
-            if task.get('task_id') == task_id:
-                return task['element']
-        return None
-
     # ---------- ОСНОВНОЙ ЦИКЛ ----------
+    @staticmethod
+    def format_hms(seconds):
+        hours, rest = divmod(int(seconds), 3600)
+        minutes, seconds = divmod(rest, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
     def monitor_tasks(self):
         logger.info("🚀 ЗАПУСК МОНИТОРИНГА ЗАДАНИЙ")
-        logger.info(f"📊 Интервал проверки: {self.config['monitor_interval']} сек")
+        logger.info("📊 Интервал проверки: %s сек", self.config['monitor_interval'])
         logger.info("⏱️ Мониторинг без ограничения по времени (до остановки пользователем)")
-        logger.info(f"📅 Интервал отчётов: {self.config['report_interval_hours']} ч")
+        logger.info("📅 Интервал отчётов: %s ч", self.config['report_interval_hours'])
 
         self.monitoring_active = True
         start_time = time.time()
         check_count = 0
+        sleep_time = self.config['monitor_interval']
+        last_task_seen = start_time
         self.last_report_time = datetime.now()
 
         print("\n" + "=" * 60)
         print("МОНИТОРИНГ ЗАДАНИЙ АКТИВЕН")
-        print("Фото извлекаются ТОЛЬКО через canvas")
+        print("Фото загружаются из браузера напрямую (canvas - запасной вариант)")
         print("Городской округ определяется по Лист2 (VLOOKUP)")
         print("Рассылка в Telegram по округам (Подольск, Чехов, Южный кластер)")
         print("#Н/Д отправляется во все три чата")
@@ -1339,76 +2062,96 @@ class ElementMonitor:
 
         try:
             # Бесконечный цикл без проверки длительности
-            while self.monitoring_active:
+            while not self._stop_event.is_set():
                 check_count += 1
                 self.stats['total_checks'] = check_count
-                elapsed = time.time() - start_time
-                hours = int(elapsed // 3600)
-                minutes = int((elapsed % 3600) // 60)
-                seconds = int(elapsed % 60)
+                # Текущее время берётся один раз за цикл
+                now = datetime.now()
+                uptime = self.format_hms(time.time() - start_time)
 
-                logger.info(f"Проверка #{check_count} (работаем: {hours:02d}:{minutes:02d}:{seconds:02d})")
-                print(
-                    f"\n[#{check_count}] {datetime.now().strftime('%H:%M:%S')} (работы: {hours:02d}:{minutes:02d}:{seconds:02d})")
+                logger.info("Проверка #%d (работаем: %s)", check_count, uptime)
+                print(f"\n[#{check_count}] {now.strftime('%H:%M:%S')} (работы: {uptime})")
 
+                processed_this_round = 0
                 try:
-                    if check_count % 5 == 1:
+                    if not self.ensure_driver():
+                        raise RuntimeError("WebDriver недоступен")
+
+                    # Перезагрузка - только если список давно не приносил новых заданий;
+                    # вместо фиксированных пауз ждём появления вкладки, а список заданий ждёт find_all_tasks
+                    if check_count % 5 == 1 and time.time() - last_task_seen > PAGE_REFRESH_IDLE_SECONDS:
                         self.driver.refresh()
-                        time.sleep(5)
+                        try:
+                            WebDriverWait(self.driver, 15).until(
+                                EC.presence_of_element_located((By.CSS_SELECTOR, ROUTES_TAB_SELECTOR)))
+                        except TimeoutException:
+                            logger.warning("Вкладка 'Маршруты' не появилась после перезагрузки")
                         self.switch_to_routes_tab()
-                        time.sleep(3)
+                        last_task_seen = time.time()
 
                     tasks = self.find_all_tasks()
                     tasks_found = len(tasks)
                     self.stats['tasks_found'] += tasks_found
                     print(f"  📋 Найдено заданий: {tasks_found}")
 
-                    processed_this_round = 0
-                    for i, task in enumerate(tasks, 1):
-                        task_key = f"{task.get('task_id')}_{hash(task.get('address', ''))}"
-                        if task_key in self.processed_tasks:
-                            continue
-                        print(f"  🔄 Обработка {i}/{tasks_found}")
+                    # Уже обработанные задания отсеиваются одним проходом до основного цикла.
+                    # Задания из очереди повторов тоже: ими управляет retry_failed_tasks по своему расписанию,
+                    # здесь только отмечаем, что задание всё ещё на странице
+                    new_tasks = []
+                    seen_at = time.time()
+                    for task in tasks:
+                        task_key = self.make_task_key(task)
+                        fail_info = self.failed_tasks.get(task_key)
+                        if fail_info is not None:
+                            fail_info['last_seen'] = seen_at
+                        elif not self.is_processed(task_key):
+                            new_tasks.append(task)
+                    if tasks_found:
+                        print(f"  🆕 Новых заданий: {len(new_tasks)}")
+
+                    for i, task in enumerate(new_tasks, 1):
+                        print(f"  🔄 Обработка {i}/{len(new_tasks)}")
+                        task_started = time.monotonic()
                         if self.process_task(task, is_retry=False):
                             processed_this_round += 1
-                        time.sleep(1.5)
+                            last_task_seen = time.time()
+                        # Не чаще одного задания в TASK_PACING_SECONDS: долгая обработка уже выдержала паузу
+                        if self._stop_event.wait(max(0.0, TASK_PACING_SECONDS - (time.monotonic() - task_started))):
+                            break
 
-                    print(f"  ✅ Обработано в этом цикле: {processed_this_round}/{tasks_found}")
+                    print(f"  ✅ Обработано в этом цикле: {processed_this_round}/{len(new_tasks)} (всего заданий: {tasks_found})")
 
-                    if self.failed_tasks:
+                    # После остановки повторы не запускаем, отчёт отправит finally
+                    if self.failed_tasks and not self._stop_event.is_set():
                         self.retry_failed_tasks()
 
                     # Проверяем, не пора ли отправить отчёт
-                    time_since_last_report = (datetime.now() - self.last_report_time).total_seconds()
-                    if time_since_last_report >= self.config['report_interval_hours'] * 3600:
+                    time_since_last_report = (now - self.last_report_time).total_seconds()
+                    if (time_since_last_report >= self.config['report_interval_hours'] * 3600
+                            and not self._stop_event.is_set()):
                         self.send_reports()
 
-                    print(
-                        f"  📈 Статистика: Всего обработано {self.stats['tasks_processed']}, Ошибок: {self.stats['errors']}")
-                    print(
-                        f"  📊 Сохранено в Google: {self.stats['saved_to_google']}, в CSV: {self.stats['saved_to_csv']}")
-                    if self.telegram_bot.enabled:
-                        print(f"  📤 Отправлено в Telegram: {self.stats['sent_to_telegram']}")
-                        print(
-                            f"      Подольск: {self.stats['telegram_podolsk']}, Чехов: {self.stats['telegram_chekhov']}, Юг: {self.stats['telegram_south']}")
-                    print(
-                        f"  📸 Получено фото (canvas): {self.stats['photos_captured']}, отправлено фото: {self.stats['photos_sent']}")
-                    print(
-                        f"  🎞️ Медиагрупп: {self.stats['media_groups_sent']}, одиночных: {self.stats['single_photos_sent']}")
-                    print(
-                        f"  🏙️ VLOOKUP: совпадений {self.stats['vlookup_matches']}, пропусков {self.stats['vlookup_misses']}")
-                    print(f"  ⏳ В очереди на повтор: {len(self.failed_tasks)}")
-                    print(
-                        f"  📅 Следующий отчёт через: {max(0, self.config['report_interval_hours'] * 3600 - time_since_last_report):.0f} сек")
+                    # Весь блок статистики - одной записью в stdout
+                    sys.stdout.write(self.CYCLE_STATS_TEMPLATE.format(
+                        telegram=self.CYCLE_STATS_TELEGRAM.format(**self.stats) if self.telegram_bot.enabled else '',
+                        retry_queue=len(self.failed_tasks),
+                        next_report=max(0, self.config['report_interval_hours'] * 3600 - time_since_last_report),
+                        **self.stats
+                    ))
 
                 except Exception as e:
-                    logger.error(f"Ошибка в цикле проверки: {e}", exc_info=True)
+                    logger.error("Ошибка в цикле проверки: %s", e, exc_info=True)
                     self.stats['errors'] += 1
 
-                # Интервал между проверками
-                sleep_time = self.config['monitor_interval']
-                print(f"  ⏳ Следующая проверка через {sleep_time} сек...")
-                time.sleep(sleep_time)
+                # Интервал между проверками: после цикла с заданиями вдвое короче, после пустого - в 1.5 раза длиннее
+                if processed_this_round:
+                    sleep_time = max(self.config['monitor_interval_min'], sleep_time / 2)
+                else:
+                    sleep_time = min(self.config['monitor_interval_max'], sleep_time * 1.5)
+                print(f"  ⏳ Следующая проверка через {sleep_time:.1f} сек...")
+                if self._stop_event.wait(sleep_time):
+                    logger.info("Получен сигнал остановки")
+                    print("\n\n🛑 МОНИТОРИНГ ОСТАНОВЛЕН")
 
         except KeyboardInterrupt:
             logger.info("Мониторинг прерван пользователем")
@@ -1416,15 +2159,16 @@ class ElementMonitor:
 
         finally:
             self.monitoring_active = False
-            total_time = time.time() - start_time
-            hours = int(total_time // 3600)
-            minutes = int((total_time % 3600) // 60)
-            seconds = int(total_time % 60)
+            # Сначала данные на диск и в таблицу (SIGTERM даёт немного времени), потом ждём отправки в Telegram:
+            # задания, которые ещё отправляются, должны попасть в итоговую статистику и финальный отчёт
+            self.flush_storage()
+            self._tg_pool.shutdown(wait=True)
+            total_time = self.format_hms(time.time() - start_time)
 
-            logger.info(f"Мониторинг завершен. Время работы: {hours:02d}:{minutes:02d}:{seconds:02d}")
+            logger.info("Мониторинг завершен. Время работы: %s", total_time)
             print("\n" + "=" * 60)
             print("МОНИТОРИНГ ЗАДАНИЙ ЗАВЕРШЕН")
-            print(f"Время работы: {hours:02d}:{minutes:02d}:{seconds:02d}")
+            print(f"Время работы: {total_time}")
             print(f"Выполнено проверок: {self.stats['total_checks']}")
             print(f"Найдено заданий: {self.stats['tasks_found']}")
             print(f"Обработано заданий: {self.stats['tasks_processed']}")
@@ -1438,7 +2182,7 @@ class ElementMonitor:
                 print(f"  • Чехов: {self.stats['telegram_chekhov']}")
                 print(f"  • Южный кластер: {self.stats['telegram_south']}")
                 print(f"  • Отчётов отправлено: {self.stats['reports_sent']}")
-            print(f"Фото получено (canvas): {self.stats['photos_captured']}")
+            print(f"Фото получено: {self.stats['photos_captured']}")
             print(f"Фото отправлено: {self.stats['photos_sent']}")
             print(f"Медиагрупп: {self.stats['media_groups_sent']}, одиночных: {self.stats['single_photos_sent']}")
             print(f"VLOOKUP совпадений: {self.stats['vlookup_matches']}, пропусков: {self.stats['vlookup_misses']}")
@@ -1448,21 +2192,40 @@ class ElementMonitor:
             # Отправляем финальный отчёт (за последний период)
             self.send_reports()
 
+    def stop(self):
+        """Остановить мониторинг после текущего задания (безопасно вызывать из другого потока и обработчика сигнала)"""
+        self._stop_event.set()
+
     def start_monitoring(self):
+        # Сбрасываем остановку до установки обработчика: SIGTERM во время запуска не должен потеряться
+        self._stop_event.clear()
+        # docker stop / systemd присылают SIGTERM: завершаемся штатно, с записью буферов
+        install_handler = threading.current_thread() is threading.main_thread()
+        if install_handler:
+            previous_sigterm = signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
         try:
             print("1. Настройка WebDriver...")
             if not self.setup_driver():
                 print("❌ Не удалось настроить WebDriver")
                 return False
+            if self._stop_event.is_set():
+                print("⏹️ Остановка во время запуска")
+                return False
 
             print("2. Авторизация на сайте...")
             if not self.login():
                 print("❌ Не удалось авторизоваться")
                 return False
+            if self._stop_event.is_set():
+                print("⏹️ Остановка во время запуска")
+                return False
 
             print("3. Переход на страницу мониторинга...")
             if not self.navigate_to_monitor_page():
                 print("⚠️ Не удалось перейти на страницу мониторинга")
+            if self._stop_event.is_set():
+                print("⏹️ Остановка во время запуска")
+                return False
 
             if self.google_sheets and self.google_sheets.worksheet:
                 print("4. Google Sheets подключены ✓")
@@ -1482,15 +2245,17 @@ class ElementMonitor:
                 test_msg = (
                     f"<b>🤖 Система мониторинга запущена.</b>\n\n"
                 )
-                for chat_id in self.chat_ids.values():
-                    if chat_id:
-                        self.telegram_bot.send_message_to_chat(chat_id, test_msg)
+                results = self.telegram_bot.send_batch([
+                    (self.telegram_bot.send_message_to_chat, (chat_id, test_msg))
+                    for chat_id in self.chat_ids.values() if chat_id
+                ])
+                logger.info("Стартовое сообщение доставлено в %d из %d чатов", sum(results), len(results))
             else:
                 print("5. Telegram бот отключен (проверьте .env)")
 
             print("\n" + "=" * 60)
             print("ВСЕ СИСТЕМЫ ГОТОВЫ")
-            print("Фото ТОЛЬКО через canvas")
+            print("Фото: напрямую из браузера (canvas - запасной вариант)")
             print("Городской округ: VLOOKUP (Лист2)")
             print("Рассылка: Подольск, Чехов, Юг, #Н/Д -> все три чата")
             print("При ошибке открытия окна: ESC + повтор (до 3 раз)")
@@ -1502,11 +2267,27 @@ class ElementMonitor:
             return True
 
         except Exception as e:
-            logger.error(f"Критическая ошибка: {e}", exc_info=True)
+            logger.error("Критическая ошибка: %s", e, exc_info=True)
             print(f"\n🔥 Критическая ошибка: {e}")
             return False
         finally:
+            self.close_storage()
+            # Дожидаемся фоновых отправок заданий (сообщения send_batch дожидается сам)
+            self._tg_pool.shutdown(wait=True)
             self.close_driver()
+            if install_handler:
+                # Возвращаем прежний обработчик: после мониторинга SIGTERM снова завершает процесс сразу
+                signal.signal(signal.SIGTERM, previous_sigterm if previous_sigterm is not None else signal.SIG_DFL)
+
+    def flush_storage(self):
+        self.processed_history.save()
+        if self.google_sheets:
+            self.google_sheets.flush()
+        self.csv_manager.flush()
+
+    def close_storage(self):
+        self.flush_storage()
+        self.csv_manager.close()
 
     def close_driver(self):
         if self.driver:
@@ -1523,7 +2304,7 @@ class ElementMonitor:
 def main():
     try:
         print("=" * 60)
-        print("МОНИТОРИНГ ЗАДАНИЙ (ФОТО ЧЕРЕЗ CANVAS + VLOOKUP + РАССЫЛКА ПО ОКРУГАМ)")
+        print("МОНИТОРИНГ ЗАДАНИЙ (ФОТО ИЗ БРАУЗЕРА + VLOOKUP + РАССЫЛКА ПО ОКРУГАМ)")
         print("=" * 60)
 
         print("\nПроверка зависимостей:")
@@ -1562,7 +2343,7 @@ def main():
 
         print("\n" + "-" * 60)
         print("ВАЖНО:")
-        print("1. Фото извлекаются ТОЛЬКО через canvas (JavaScript)")
+        print("1. Фото загружаются из браузера напрямую (JavaScript fetch, запасной вариант - canvas)")
         print("2. Городской округ определяется по Лист2 (VLOOKUP)")
         print("3. В Google Sheets в столбец L вставляется формула =VLOOKUP(Cn;'Лист2'!A:B;2;0)")
         print("4. Рассылка в Telegram:")
@@ -1582,7 +2363,7 @@ def main():
 
         print("\n" + "=" * 60)
         print("ЗАПУСК МОНИТОРИНГА")
-        print("Фото через canvas, округ через VLOOKUP, рассылка по округам, отчёты каждые 3 ч")
+        print("Фото из браузера, округ через VLOOKUP, рассылка по округам, отчёты каждые 3 ч")
         print("=" * 60)
 
         success = monitor.start_monitoring()
@@ -1604,7 +2385,7 @@ if __name__ == "__main__":
     print("\nСозданные файлы:")
     print("  • logs/ - папка с логами")
     print("  • monitoring_data.csv - данные")
-    print("  • backup_YYYYMMDD.json - резервная копия")
+    print("  • backup_YYYYMMDD.jsonl - резервная копия (JSON Lines)")
     print("  • monitoring_report.json - отчет")
     print("  • debug_logs/ - отладка")
     print("  • downloaded_photos/ - фото (если включено)")